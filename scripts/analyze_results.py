@@ -12,17 +12,50 @@ uma tabela CSV com todas as métricas de avaliação, incluindo:
 - Falsos Negativos (FN)
 """
 
+import codecs
 import sqlite3
 import pandas as pd
 import json
 from pathlib import Path
-from typing import Dict, List, Optional, Tuple
+from typing import Dict, List
 import argparse
 from datetime import datetime
 
+# Limite padrão de parâmetros (?) por consulta no SQLite
+SQLITE_MAX_VARIABLES = 999
+
 class ResultsAnalyzer:
     """Analisador de resultados do teste de proficiência"""
 
+    # Query complexa que junta todas as tabelas necessárias; mantida como
+    # constante para que o cache de statements do sqlite3 reaproveite o plano
+    EXTRACT_RESULTS_QUERY = """
+    SELECT
+        p.voluntary_code AS codigo_participante,
+        p.voluntary_name AS nome_participante,
+        p.carry_code AS codigo_amostra,
+        s.id AS sample_id,
+        g.id AS group_id,
+        g.group_id AS codigo_grupo,
+        g.group_index AS indice_grupo,
+        g.has_same_source,
+        g.questionada_filename AS arquivo_questionada,
+        g.padroes_filenames AS arquivos_padroes,
+        g.matched_image_index AS indice_verdadeiro,
+        g.status AS status_grupo,
+        r.conclusive,
+        r.has_match,
+        r.matched_image_index AS indice_respondido,
+        r.compatibility_degree AS grau_compatibilidade,
+        r.notes AS observacoes,
+        r.submitted_at AS data_submissao
+    FROM results r
+    INNER JOIN groups g ON r.group_id = g.id
+    INNER JOIN samples s ON r.sample_id = s.id
+    INNER JOIN participants p ON s.participant_id = p.id
+    ORDER BY p.voluntary_code, s.id, g.group_index
+    """
+
     def __init__(self, db_path: str):
         """
         Inicializa o analisador
@@ -35,109 +68,107 @@ class ResultsAnalyzer:
             raise FileNotFoundError(f"Banco de dados não encontrado: {db_path}")
 
         self.conn = sqlite3.connect(str(self.db_path))
-        self.conn.row_factory = sqlite3.Row
+        self._prepare_database()
 
-    def __del__(self):
-        """Fecha conexão com o banco ao destruir o objeto"""
-        if hasattr(self, 'conn'):
+    def _prepare_database(self):
+        """
+        Aplica as PRAGMAs de desempenho da conexão; o banco em si (que pode
+        ser uma cópia de backup somente leitura) não é alterado
+        """
+        # Cache de ~50 MB, temporários em memória e leitura via mmap para que
+        # o JOIN e a ordenação dos resultados não usem arquivos temporários.
+        # Os índices das consultas já são criados por backend/src/database/schema.ts
+        self.conn.execute('PRAGMA cache_size = -50000')
+        self.conn.execute('PRAGMA temp_store = MEMORY')
+        self.conn.execute('PRAGMA mmap_size = 268435456')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        """Atualiza as estatísticas do planejador e fecha a conexão com o banco"""
+        # Pode ser chamado mais de uma vez (ex.: close() explícito dentro do with)
+        if self.conn is None:
+            return
+        # O optimize pode gravar no banco: em bancos somente leitura ele falha,
+        # e dentro do __exit__ o erro esconderia a exceção original do with
+        try:
+            self.conn.execute('PRAGMA optimize')
+        except sqlite3.Error:
+            pass
+        finally:
             self.conn.close()
+            self.conn = None
 
-    def get_quality_from_cache(self, filename: str) -> Optional[int]:
+    def load_quality_map(self, filenames: List[str]) -> Dict[str, int]:
         """
-        Obtém a qualidade da imagem do cache de comparações pareadas
+        Carrega a qualidade das imagens do cache de comparações pareadas
 
         Args:
-            filename: Nome do arquivo de imagem
+            filenames: Nomes dos arquivos de imagem
 
         Returns:
-            Qualidade da imagem ou None se não encontrada
+            Dicionário {nome do arquivo: qualidade} (ausentes não aparecem)
         """
         cursor = self.conn.cursor()
+        quality_map: Dict[str, int] = {}
 
-        # Tenta primeiro como arquivo_a
-        cursor.execute("""
-            SELECT quali_a FROM pairwise_cache
-            WHERE arquivo_a = ?
-            LIMIT 1
-        """, (filename,))
-
-        result = cursor.fetchone()
-        if result:
-            return result['quali_a']
-
-        # Tenta como arquivo_b
-        cursor.execute("""
-            SELECT quali_b FROM pairwise_cache
-            WHERE arquivo_b = ?
-            LIMIT 1
-        """, (filename,))
-
-        result = cursor.fetchone()
-        if result:
-            return result['quali_b']
-
-        return None
-
-    def calculate_metrics(self,
-                         has_same_source: bool,
-                         true_match_index: Optional[int],
-                         conclusive: bool,
-                         has_match: Optional[bool],
-                         matched_image_index: Optional[int]) -> Dict[str, int]:
+        # Tenta primeiro como arquivo_a, depois como arquivo_b; a primeira
+        # ocorrência de cada arquivo prevalece
+        for file_column, quality_column in (('arquivo_a', 'quali_a'), ('arquivo_b', 'quali_b')):
+            for start in range(0, len(filenames), SQLITE_MAX_VARIABLES):
+                chunk = filenames[start:start + SQLITE_MAX_VARIABLES]
+                placeholders = ', '.join('?' * len(chunk))
+                cursor.execute(f"""
+                    SELECT {file_column}, {quality_column} FROM pairwise_cache
+                    WHERE {file_column} IN ({placeholders})
+                """, chunk)
+
+                for filename, quality in cursor.fetchall():
+                    quality_map.setdefault(filename, quality)
+
+        return quality_map
+
+    def calculate_metrics(self, df: pd.DataFrame) -> pd.DataFrame:
         """
-        Calcula as métricas de avaliação (TP, TN, FP, FN)
+        Calcula as métricas de avaliação (TP, TN, FP, FN) para todas as linhas
 
         Args:
-            has_same_source: Se o grupo tem correspondência verdadeira
-            true_match_index: Índice da correspondência verdadeira (0-9)
-            conclusive: Se a resposta foi conclusiva
-            has_match: Se o participante identificou correspondência
-            matched_image_index: Índice da imagem identificada (0-9)
+            df: DataFrame com as colunas has_same_source, indice_verdadeiro,
+                conclusive, has_match e indice_respondido
 
         Returns:
-            Dicionário com as métricas calculadas
+            DataFrame com as métricas calculadas adicionadas
         """
+        # Colunas como arrays NumPy contíguos (sem alinhamento de índice)
+        conclusive = df['conclusive'].to_numpy(dtype=bool)
+        has_match = df['has_match'].to_numpy(dtype=bool, na_value=False)
+        has_same_source = df['has_same_source'].to_numpy(dtype=bool)
+        # Índices ausentes (None) são considerados iguais entre si
+        correct_index = (
+            df['indice_respondido'].to_numpy(dtype='int64', na_value=-1)
+            == df['indice_verdadeiro'].to_numpy(dtype='int64', na_value=-1)
+        )
+
         metrics = {
-            'conclusivo': 1 if conclusive else 0,
-            'identificou': 0,
-            'verdadeiro_positivo': 0,
-            'verdadeiro_negativo': 0,
-            'falso_positivo': 0,
-            'falso_negativo': 0
+            # Se não foi conclusivo, todas as métricas ficam zeradas
+            'conclusivo': conclusive,
+            'identificou': conclusive & has_match,
+            # Existe correspondência verdadeira e o participante acertou a imagem
+            'verdadeiro_positivo': conclusive & has_same_source & has_match & correct_index,
+            # Identificou match na imagem errada, ou match onde não existe
+            'falso_positivo': conclusive & has_match & (~has_same_source | ~correct_index),
+            # Participante disse que NÃO há match (mas existe)
+            'falso_negativo': conclusive & has_same_source & ~has_match,
+            # Participante disse que NÃO há match (correto)
+            'verdadeiro_negativo': conclusive & ~has_same_source & ~has_match,
         }
 
-        # Se não foi conclusivo, retorna zeros
-        if not conclusive:
-            return metrics
-
-        # Marca se identificou correspondência
-        if has_match is not None:
-            metrics['identificou'] = 1 if has_match else 0
-
-        # Calcula TP, TN, FP, FN
-        if has_same_source:
-            # Existe correspondência verdadeira no grupo
-            if has_match:
-                # Participante disse que há match
-                if matched_image_index == true_match_index:
-                    # Acertou a imagem correta
-                    metrics['verdadeiro_positivo'] = 1
-                else:
-                    # Identificou match mas na imagem errada
-                    metrics['falso_positivo'] = 1
-            else:
-                # Participante disse que NÃO há match (mas existe)
-                metrics['falso_negativo'] = 1
-        else:
-            # NÃO existe correspondência verdadeira no grupo
-            if has_match:
-                # Participante disse que há match (mas não existe)
-                metrics['falso_positivo'] = 1
-            else:
-                # Participante disse que NÃO há match (correto)
-                metrics['verdadeiro_negativo'] = 1
-
-        return metrics
+        # Flags 0/1 em int8: 8x menos memória nas reduções do resumo
+        return df.assign(**{name: values.astype('int8') for name, values in metrics.items()})
 
     def extract_results(self) -> pd.DataFrame:
         """
@@ -146,72 +177,36 @@ class ResultsAnalyzer:
         Returns:
             DataFrame com todos os resultados e métricas
         """
-        cursor = self.conn.cursor()
+        # Tipos definidos na leitura: flags NOT NULL compactas e colunas que
+        # aceitam NULL como inteiros anuláveis (Int8/Int64)
+        df = pd.read_sql_query(
+            self.EXTRACT_RESULTS_QUERY,
+            self.conn,
+            dtype={
+                'has_same_source': 'int8',
+                'conclusive': 'int8',
+                'indice_grupo': 'int32',
+                'has_match': 'Int8',
+                'indice_verdadeiro': 'Int64',
+                'indice_respondido': 'Int64',
+            }
+        )
 
-        # Query complexa que junta todas as tabelas necessárias
-        query = """
-        SELECT
-            p.voluntary_code AS codigo_participante,
-            p.voluntary_name AS nome_participante,
-            p.carry_code AS codigo_amostra,
-            s.id AS sample_id,
-            g.id AS group_id,
-            g.group_id AS codigo_grupo,
-            g.group_index AS indice_grupo,
-            g.has_same_source,
-            g.questionada_filename AS arquivo_questionada,
-            g.padroes_filenames AS arquivos_padroes,
-            g.matched_image_index AS indice_verdadeiro,
-            g.status AS status_grupo,
-            r.conclusive,
-            r.has_match,
-            r.matched_image_index AS indice_respondido,
-            r.compatibility_degree AS grau_compatibilidade,
-            r.notes AS observacoes,
-            r.submitted_at AS data_submissao
-        FROM results r
-        INNER JOIN groups g ON r.group_id = g.id
-        INNER JOIN samples s ON r.sample_id = s.id
-        INNER JOIN participants p ON s.participant_id = p.id
-        ORDER BY p.voluntary_code, s.id, g.group_index
-        """
-
-        cursor.execute(query)
-        rows = cursor.fetchall()
-
-        if not rows:
+        if df.empty:
             print("⚠️  Nenhum resultado encontrado no banco de dados")
             return pd.DataFrame()
 
-        # Converte para lista de dicionários
-        data = []
-        for row in rows:
-            row_dict = dict(row)
-
-            # Extrai qualidade da imagem questionada
-            qualidade = self.get_quality_from_cache(row_dict['arquivo_questionada'])
-            row_dict['qualidade_questionada'] = qualidade if qualidade is not None else 0
-
-            # Calcula métricas
-            metrics = self.calculate_metrics(
-                has_same_source=bool(row_dict['has_same_source']),
-                true_match_index=row_dict['indice_verdadeiro'],
-                conclusive=bool(row_dict['conclusive']),
-                has_match=bool(row_dict['has_match']) if row_dict['has_match'] is not None else None,
-                matched_image_index=row_dict['indice_respondido']
-            )
+        # Ajusta grau de compatibilidade (0 se não respondeu)
+        df['grau_compatibilidade'] = df['grau_compatibilidade'].fillna(0).astype(int)
 
-            # Adiciona métricas ao dicionário
-            row_dict.update(metrics)
+        # Extrai qualidade da imagem questionada (0 se não encontrada no cache)
+        quality_map = self.load_quality_map(df['arquivo_questionada'].unique().tolist())
+        df['qualidade_questionada'] = (
+            df['arquivo_questionada'].map(quality_map).fillna(0).astype(int)
+        )
 
-            # Ajusta grau de compatibilidade (0 se não respondeu)
-            if row_dict['grau_compatibilidade'] is None:
-                row_dict['grau_compatibilidade'] = 0
-
-            data.append(row_dict)
-
-        # Cria DataFrame
-        df = pd.DataFrame(data)
+        # Calcula métricas
+        df = self.calculate_metrics(df)
 
         # Reordena colunas para melhor visualização
         column_order = [
@@ -252,18 +247,30 @@ class ResultsAnalyzer:
         if df.empty:
             return {}
 
+        # Todas as contagens em uma única agregação
+        totals = df.agg({
+            'codigo_participante': 'nunique',
+            'codigo_amostra': 'nunique',
+            'conclusivo': 'sum',
+            'identificou': 'sum',
+            'verdadeiro_positivo': 'sum',
+            'verdadeiro_negativo': 'sum',
+            'falso_positivo': 'sum',
+            'falso_negativo': 'sum',
+        })
+
         stats = {
-            'total_participantes': df['codigo_participante'].nunique(),
-            'total_amostras': df['codigo_amostra'].nunique(),
+            'total_participantes': totals['codigo_participante'],
+            'total_amostras': totals['codigo_amostra'],
             'total_grupos_avaliados': len(df),
-            'total_conclusivos': df['conclusivo'].sum(),
-            'total_inconclusivos': len(df) - df['conclusivo'].sum(),
-            'total_com_match': df['identificou'].sum(),
-            'total_sem_match': (df['conclusivo'] == 1).sum() - df['identificou'].sum(),
-            'total_verdadeiros_positivos': df['verdadeiro_positivo'].sum(),
-            'total_verdadeiros_negativos': df['verdadeiro_negativo'].sum(),
-            'total_falsos_positivos': df['falso_positivo'].sum(),
-            'total_falsos_negativos': df['falso_negativo'].sum(),
+            'total_conclusivos': totals['conclusivo'],
+            'total_inconclusivos': len(df) - totals['conclusivo'],
+            'total_com_match': totals['identificou'],
+            'total_sem_match': totals['conclusivo'] - totals['identificou'],
+            'total_verdadeiros_positivos': totals['verdadeiro_positivo'],
+            'total_verdadeiros_negativos': totals['verdadeiro_negativo'],
+            'total_falsos_positivos': totals['falso_positivo'],
+            'total_falsos_negativos': totals['falso_negativo'],
         }
 
         # Calcula taxas
@@ -291,7 +298,35 @@ class ResultsAnalyzer:
             output_path: Caminho do arquivo CSV de saída
         """
         output_file = Path(output_path)
-        df.to_csv(output_file, index=False, encoding='utf-8-sig')
+
+        # Escritor CSV nativo do pyarrow; o BOM mantém a compatibilidade com o
+        # Excel, como no encoding utf-8-sig (o texto não é byte a byte igual
+        # ao do pandas: o pyarrow coloca strings e cabeçalho entre aspas).
+        # O CSV é montado em memória antes de abrir o arquivo, para que um erro
+        # de conversão não deixe um arquivo truncado
+        csv_data = None
+        try:
+            import pyarrow as pa
+            import pyarrow.csv as pv
+
+            try:
+                table = pa.Table.from_pandas(df, preserve_index=False)
+                sink = pa.BufferOutputStream()
+                pv.write_csv(table, sink)
+                csv_data = sink.getvalue()
+            except pa.ArrowException:
+                # Colunas que o Arrow não converte (ex.: BLOBs) ficam com o pandas
+                csv_data = None
+        except ImportError:
+            pass
+
+        if csv_data is None:
+            df.to_csv(output_file, index=False, encoding='utf-8-sig')
+        else:
+            with open(output_file, 'wb') as f:
+                f.write(codecs.BOM_UTF8)
+                f.write(csv_data)
+
         print(f"✅ Resultados exportados para: {output_file}")
         print(f"📊 Total de registros: {len(df)}")
 
@@ -304,18 +339,46 @@ class ResultsAnalyzer:
             output_path: Caminho do arquivo Excel de saída
         """
         try:
-            output_file = Path(output_path)
+            from openpyxl import Workbook
+            from openpyxl.cell import WriteOnlyCell
+            from openpyxl.styles import Alignment, Border, Font, Side
 
-            with pd.ExcelWriter(output_file, engine='openpyxl') as writer:
-                # Aba principal com os dados
-                df.to_excel(writer, sheet_name='Resultados', index=False)
+            output_file = Path(output_path)
 
-                # Aba com estatísticas
-                stats = self.generate_summary_statistics(df)
-                if stats:
-                    stats_df = pd.DataFrame([stats]).T
-                    stats_df.columns = ['Valor']
-                    stats_df.to_excel(writer, sheet_name='Estatísticas')
+            # Cabeçalhos no mesmo estilo do pandas: negrito, com borda fina
+            thin = Side(style='thin')
+            header_font = Font(bold=True)
+            header_border = Border(left=thin, right=thin, top=thin, bottom=thin)
+            header_alignment = Alignment(horizontal='center', vertical='top')
+            index_alignment = Alignment(vertical='top')
+
+            def header_cell(sheet, value, alignment=header_alignment):
+                cell = WriteOnlyCell(sheet, value=value)
+                cell.font = header_font
+                cell.border = header_border
+                cell.alignment = alignment
+                return cell
+
+            # Modo write_only grava as linhas direto no arquivo, sem montar o
+            # modelo completo da planilha em memória
+            workbook = Workbook(write_only=True)
+
+            # Aba principal com os dados (valores ausentes viram células vazias)
+            sheet = workbook.create_sheet('Resultados')
+            sheet.append([header_cell(sheet, column) for column in df.columns])
+            values = df.astype(object).where(df.notna(), None)
+            for row in values.itertuples(index=False):
+                sheet.append(row)
+
+            # Aba com estatísticas
+            stats = self.generate_summary_statistics(df)
+            if stats:
+                stats_sheet = workbook.create_sheet('Estatísticas')
+                stats_sheet.append([None, header_cell(stats_sheet, 'Valor')])
+                for key, value in stats.items():
+                    stats_sheet.append([header_cell(stats_sheet, key, index_alignment), value])
+
+            workbook.save(output_file)
 
             print(f"✅ Resultados exportados para: {output_file}")
             print(f"📊 Total de registros: {len(df)}")
@@ -382,48 +445,47 @@ Exemplos de uso:
     try:
         # Inicializa analisador
         print(f"🔍 Conectando ao banco de dados: {args.db}")
-        analyzer = ResultsAnalyzer(args.db)
-
-        # Extrai resultados
-        print("📥 Extraindo resultados...")
-        df = analyzer.extract_results()
-
-        if df.empty:
-            print("❌ Nenhum resultado encontrado no banco de dados")
-            return
+        with ResultsAnalyzer(args.db) as analyzer:
+            # Extrai resultados
+            print("📥 Extraindo resultados...")
+            df = analyzer.extract_results()
+
+            if df.empty:
+                print("❌ Nenhum resultado encontrado no banco de dados")
+                return
+
+            # Gera estatísticas
+            print("\n📈 ESTATÍSTICAS GERAIS")
+            print("-" * 70)
+            stats = analyzer.generate_summary_statistics(df)
+
+            for key, value in stats.items():
+                label = key.replace('_', ' ').title()
+                if 'taxa' in key or 'acuracia' in key:
+                    print(f"  {label:<40} {value:>8.2f}%")
+                else:
+                    print(f"  {label:<40} {value:>8}")
 
-        # Gera estatísticas
-        print("\n📈 ESTATÍSTICAS GERAIS")
-        print("-" * 70)
-        stats = analyzer.generate_summary_statistics(df)
+            # Se apenas estatísticas, para aqui
+            if args.stats_only:
+                return
 
-        for key, value in stats.items():
-            label = key.replace('_', ' ').title()
-            if 'taxa' in key or 'acuracia' in key:
-                print(f"  {label:<40} {value:>8.2f}%")
+            # Define nome do arquivo de saída
+            if args.output is None:
+                timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+                if args.format == 'excel':
+                    output_path = f'resultados_{timestamp}.xlsx'
+                else:
+                    output_path = f'resultados_{timestamp}.csv'
             else:
-                print(f"  {label:<40} {value:>8}")
+                output_path = args.output
 
-        # Se apenas estatísticas, para aqui
-        if args.stats_only:
-            return
-
-        # Define nome do arquivo de saída
-        if args.output is None:
-            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+            # Exporta
+            print(f"\n💾 Exportando resultados...")
             if args.format == 'excel':
-                output_path = f'resultados_{timestamp}.xlsx'
+                analyzer.export_to_excel(df, output_path)
             else:
-                output_path = f'resultados_{timestamp}.csv'
-        else:
-            output_path = args.output
-
-        # Exporta
-        print(f"\n💾 Exportando resultados...")
-        if args.format == 'excel':
-            analyzer.export_to_excel(df, output_path)
-        else:
-            analyzer.export_to_csv(df, output_path)
+                analyzer.export_to_csv(df, output_path)
 
         print("\n✅ Análise concluída com sucesso!")
 
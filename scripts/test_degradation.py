@@ -4,48 +4,44 @@ Script para testar degradação de imagens com blur elíptico (motion blur)
 Simula deslocamento de câmera com forma elíptica e motion blur radial
 """
 
+import os
 import sys
 import cv2
 import numpy as np
 import argparse
 from pathlib import Path
+from contextlib import nullcontext
+from functools import lru_cache, partial
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 
+# Gerador padrão (PCG64) reaproveitado quando nenhum rng é informado
+_RNG = np.random.default_rng()
 
-def create_motion_blur_kernel(size, angle):
+
+@lru_cache(maxsize=8)
+def _blur_level_lut(blur_levels):
     """
-    Cria kernel de motion blur linear
+    Tabelas de consulta (256 entradas) do gradiente quantizado em uint8 para
+    a pirâmide de blur: índice do nível inferior e fração de interpolação
 
     Args:
-        size: Tamanho do kernel (deve ser ímpar)
-        angle: Ângulo em graus (0 = horizontal direita, 90 = vertical para cima)
+        blur_levels: Tupla com os tamanhos de kernel dos níveis de referência
 
     Returns:
-        Kernel normalizado para motion blur
+        Tuple: (lut_idx, lut_frac)
     """
-    kernel = np.zeros((size, size), dtype=np.float32)
-    center = size // 2
-
-    # Converte ângulo para radianos
-    angle_rad = np.deg2rad(angle)
-
-    # Calcula direção do motion blur
-    dx = np.cos(angle_rad)
-    dy = -np.sin(angle_rad)  # Negativo porque y cresce para baixo
+    # Nível 0 é a imagem sem blur; o gradiente 0..1 vira um kernel contínuo 0..máximo
+    level_sizes = np.array((0,) + blur_levels, dtype=np.float32)
+    kernel_pos = np.arange(256, dtype=np.float32) / 255 * level_sizes[-1]
 
-    # Desenha linha no kernel
-    for i in range(size):
-        offset = i - center
-        x = int(center + offset * dx)
-        y = int(center + offset * dy)
+    lut_idx = np.searchsorted(level_sizes, kernel_pos, side='right') - 1
+    lut_idx = np.clip(lut_idx, 0, len(level_sizes) - 2)
+    lut_frac = (kernel_pos - level_sizes[lut_idx]) / (level_sizes[lut_idx + 1] - level_sizes[lut_idx])
 
-        if 0 <= x < size and 0 <= y < size:
-            kernel[y, x] = 1.0
+    lut_idx.flags.writeable = False
+    lut_frac.flags.writeable = False
 
-    # Normaliza
-    if kernel.sum() > 0:
-        kernel = kernel / kernel.sum()
-
-    return kernel
+    return lut_idx, lut_frac
 
 
 def smoothstep(x):
@@ -53,8 +49,40 @@ def smoothstep(x):
     Função de suavização Hermite (smoothstep)
     Retorna transição suave de 0 a 1 para x em [0, 1]
     """
+    # x² * (3 - 2x) com operações in-place: só a cópia recortada e o
+    # resultado são alocados (a entrada do chamador não é alterada)
     x = np.clip(x, 0, 1)
-    return x * x * (3 - 2 * x)
+    out = x * x
+    x *= -2
+    x += 3
+    out *= x
+    return out
+
+
+def ellipse_bounding_box(h, w, center_x, center_y, a, b, angle, pad=0):
+    """
+    Calcula o retângulo envolvente (alinhado aos eixos) de uma elipse rotacionada
+
+    Args:
+        h, w: Dimensões da imagem
+        center_x, center_y: Centro da elipse
+        a, b: Raios da elipse
+        angle: Ângulo de rotação em graus
+        pad: Margem extra em pixels
+
+    Returns:
+        Tuple: (x0, x1, y0, y1) limitado às dimensões da imagem
+    """
+    angle_rad = np.deg2rad(angle)
+    half_w = np.hypot(a * np.cos(angle_rad), b * np.sin(angle_rad))
+    half_h = np.hypot(a * np.sin(angle_rad), b * np.cos(angle_rad))
+
+    x0 = max(int(np.floor(center_x - half_w)) - pad, 0)
+    x1 = min(int(np.ceil(center_x + half_w)) + pad + 1, w)
+    y0 = max(int(np.floor(center_y - half_h)) - pad, 0)
+    y1 = min(int(np.ceil(center_y + half_h)) + pad + 1, h)
+
+    return x0, x1, y0, y1
 
 
 def create_gradient_mask(h, w, center_x, center_y, a, b, angle):
@@ -77,80 +105,103 @@ def create_gradient_mask(h, w, center_x, center_y, a, b, angle):
         - mask_radial: Máscara radial da imagem
         - mask_ellipse: Máscara da elipse (antes de inverter)
     """
-    # Cria máscara elíptica base
-    mask = np.zeros((h, w), dtype=np.uint8)
-    cv2.ellipse(mask, (center_x, center_y), (a, b), angle, 0, 360, 255, -1)
-
     # Centro da imagem
     img_center_x = w // 2
     img_center_y = h // 2
 
-    # Cria grid de coordenadas
-    y_coords, x_coords = np.mgrid[0:h, 0:w]
+    # Coordenadas como vetores 1-D em float32 (linha e coluna), expandidos
+    # para 2-D apenas por broadcasting
+    x_coords = np.arange(w, dtype=np.float32)[np.newaxis, :]
+    y_coords = np.arange(h, dtype=np.float32)[:, np.newaxis]
 
     # === MÁSCARA 1: Radial da IMAGEM (0 no centro → 1 nas bordas) ===
+    # Quadrados calculados nos vetores 1-D; só a soma e a raiz são 2-D
     dist_from_img_center = np.sqrt(
         (x_coords - img_center_x) ** 2 +
         (y_coords - img_center_y) ** 2
     )
 
+    # === Máscara radial da imagem inteira (0 no centro → 1 nas bordas) ===
+    max_dist = np.float32(np.sqrt(img_center_x ** 2 + img_center_y ** 2))
+    if max_dist > 0:
+        mask_radial_full = 0.5*dist_from_img_center / max_dist
+    else:
+        mask_radial_full = np.zeros((h, w), dtype=np.float32)
+
     # === MÁSCARA 2: Distância normalizada da ELIPSE (0 no centro → 1 nas bordas) ===
+    # Fora do retângulo envolvente da elipse o gradiente e a máscara da elipse
+    # são zero: os cálculos da elipse ficam restritos a ele
+    x0, x1, y0, y1 = ellipse_bounding_box(h, w, center_x, center_y, a, b, angle)
+
+    # Elipse inteiramente fora da imagem: gradiente e máscara da elipse zerados
+    if x1 <= x0 or y1 <= y0:
+        return np.zeros((h, w), dtype=np.float32), mask_radial_full, np.zeros((h, w), dtype=np.float32)
+
     # Converte ângulo para radianos
     angle_rad = np.deg2rad(angle)
 
     # Translada coordenadas para o centro da elipse
-    x_shifted = x_coords - center_x
-    y_shifted = y_coords - center_y
-
-    # Rotaciona coordenadas (rotação inversa)
-    x_rot = x_shifted * np.cos(-angle_rad) - y_shifted * np.sin(-angle_rad)
-    y_rot = x_shifted * np.sin(-angle_rad) + y_shifted * np.cos(-angle_rad)
+    x_shifted = x_coords[:, x0:x1] - center_x
+    y_shifted = y_coords[y0:y1] - center_y
 
-    # Calcula distância normalizada da elipse
-    # Pontos na borda da elipse têm dist_ellipse = 1.0
-    # Evita divisão por zero
-    a_safe = max(a, 1)
+    # Rotaciona coordenadas (rotação inversa) já normalizadas pelos raios: a
+    # escala 1/a e 1/b entra nos coeficientes, aplicados aos vetores 1-D.
+    # Escalares em float32 para não promover as matrizes para float64
+    a_safe = max(a, 1)  # Evita divisão por zero
     b_safe = max(b, 1)
-    dist_from_ellipse_center = np.sqrt((x_rot / a_safe) ** 2 + (y_rot / b_safe) ** 2)
+    cos_a = np.float32(np.cos(-angle_rad))
+    sin_a = np.float32(np.sin(-angle_rad))
+    x_rot = x_shifted * (cos_a / a_safe) - y_shifted * (sin_a / a_safe)
+    y_rot = x_shifted * (sin_a / b_safe) + y_shifted * (cos_a / b_safe)
 
-    # === Máscara radial da imagem inteira (0 no centro → 1 nas bordas) ===
-    max_dist = np.sqrt(img_center_x ** 2 + img_center_y ** 2)
-    if max_dist > 0:
-        mask_radial_full = 0.5*dist_from_img_center / max_dist
-    else:
-        mask_radial_full = np.zeros((h, w), dtype=np.float32)
+    # Calcula distância normalizada da elipse (sqrt(x² + y²) numa única
+    # passada do OpenCV). Pontos na borda da elipse têm dist_ellipse = 1.0
+    dist_from_ellipse_center = cv2.magnitude(x_rot, y_rot)
 
     # Aplica apenas dentro da máscara elíptica para o gradiente e elipse
+    # (gradient_box e mask_ellipse_box são vistas do retângulo envolvente)
     gradient = np.zeros((h, w), dtype=np.float32)
     mask_ellipse_full = np.zeros((h, w), dtype=np.float32)
-    ellipse_region = mask > 0
+    gradient_box = gradient[y0:y1, x0:x1]
+    mask_ellipse_box = mask_ellipse_full[y0:y1, x0:x1]
+    # Região da elipse: pontos com distância normalizada até a borda (<= 1)
+    ellipse_region = dist_from_ellipse_center <= 1.0
+
+    # Extremos das distâncias dentro da elipse, calculados analiticamente (sem
+    # reduções mascaradas): a distância da elipse vai de 0 (centro) a 1
+    # (borda); a distância ao centro da imagem vai de d0 - e a d0 + e, com d0
+    # a distância entre os centros e e a extensão da elipse na direção radial
+    offset_x = center_x - img_center_x
+    offset_y = center_y - img_center_y
+    d0 = np.hypot(offset_x, offset_y)
+    if d0 > 0:
+        u_major = (offset_x * np.cos(angle_rad) + offset_y * np.sin(angle_rad)) / d0
+        u_minor = (offset_y * np.cos(angle_rad) - offset_x * np.sin(angle_rad)) / d0
+        extent = np.hypot(a * u_major, b * u_minor)
+    else:
+        extent = max(a, b)
+    min_img = np.float32(max(0.0, d0 - extent))
+    max_img = np.float32(d0 + extent)
 
     if ellipse_region.any():
         # Normaliza distâncias da imagem dentro da elipse
-        dist_img_in_ellipse = dist_from_img_center[ellipse_region]
-        min_img = dist_img_in_ellipse.min()
-        max_img = dist_img_in_ellipse.max()
+        dist_img_in_ellipse = dist_from_img_center[y0:y1, x0:x1][ellipse_region]
 
         if max_img > min_img:
             mask_radial_img = (dist_img_in_ellipse - min_img) / (max_img - min_img)
+            # Pontos fora do eixo radial podem passar levemente dos extremos
+            np.clip(mask_radial_img, 0, 1, out=mask_radial_img)
         else:
             mask_radial_img = np.ones_like(dist_img_in_ellipse) * 0.5
 
-        # Normaliza distâncias da elipse
-        dist_ellipse_in_region = dist_from_ellipse_center[ellipse_region]
-        min_ellipse = dist_ellipse_in_region.min()
-        max_ellipse = dist_ellipse_in_region.max()
-
-        if max_ellipse > min_ellipse:
-            mask_ellipse_dist = (dist_ellipse_in_region - min_ellipse) / (max_ellipse - min_ellipse)
-        else:
-            mask_ellipse_dist = np.zeros_like(dist_ellipse_in_region)
+        # Distâncias da elipse já estão normalizadas em [0, 1]
+        mask_ellipse_dist = dist_from_ellipse_center[ellipse_region]
 
         # Aplica smoothstep para suavizar o gradiente da elipse
         mask_ellipse_smooth = smoothstep(mask_ellipse_dist)
 
         # Salva máscara da elipse para debug
-        mask_ellipse_full[ellipse_region] = mask_ellipse_smooth
+        mask_ellipse_box[ellipse_region] = mask_ellipse_smooth
 
         # Combina as máscaras por multiplicação:
         # mask_radial_img: 0 no centro da imagem → 1 nas bordas
@@ -162,15 +213,13 @@ def create_gradient_mask(h, w, center_x, center_y, a, b, angle):
         if combined.max() > 0:
             combined = combined / combined.max()
 
-        gradient[ellipse_region] = combined
-
         # Garante valor mínimo de 0.05 para ter algum blur em toda a região
-        gradient[ellipse_region] = np.clip(gradient[ellipse_region], 0.05, 1.0)
+        gradient_box[ellipse_region] = np.clip(combined, 0.05, 1.0)
 
     return gradient, mask_radial_full, mask_ellipse_full
 
 
-def add_noise(image, noise_type='mixed', intensity=0.5):
+def add_noise(image, noise_type='mixed', intensity=0.5, rng=None):
     """
     Adiciona ruído à imagem para simular degradação
 
@@ -178,45 +227,48 @@ def add_noise(image, noise_type='mixed', intensity=0.5):
         image: Imagem de entrada
         noise_type: Tipo de ruído ('gaussian', 'salt_pepper', 'mixed')
         intensity: Intensidade do ruído (0.0 a 1.0)
+        rng: Gerador aleatório (np.random.Generator); None usa o gerador do módulo
 
     Returns:
         Imagem com ruído adicionado
     """
-    noisy = image.copy().astype(np.float32)
+    if rng is None:
+        rng = _RNG
+
+    noisy = image.astype(np.float32)
 
     if noise_type in ['gaussian', 'mixed']:
         # Ruído gaussiano (simula granulação do sensor/papel)
         sigma = 5 + intensity * 5  # 5 a 15
-        gaussian_noise = np.random.normal(0, sigma, image.shape).astype(np.float32)
-        noisy = noisy + gaussian_noise
+        gaussian_noise = np.empty(image.shape, dtype=np.float32)
+        rng.standard_normal(dtype=np.float32, out=gaussian_noise)
+        gaussian_noise *= sigma
+        noisy += gaussian_noise
 
     if noise_type in ['salt_pepper', 'mixed']:
         # Salt-and-pepper (simula pixels com/sem tinta)
         amount = 0.005 * intensity  # 0.5% a 1%
 
-        # Salt (pixels brancos)
+        # Uma única amostragem de índices planos: a primeira metade vira salt
+        # (branco) e a segunda pepper (preto). Com densidade baixa, sortear
+        # só os pixels afetados custa bem menos que uma amostra por pixel
         num_salt = int(amount * image.size)
-        coords_salt = [np.random.randint(0, i, num_salt) for i in image.shape[:2]]
-        if len(image.shape) == 3:
-            noisy[coords_salt[0], coords_salt[1], :] = 255
-        else:
-            noisy[coords_salt[0], coords_salt[1]] = 255
+        flat = rng.integers(0, image.shape[0] * image.shape[1], size=2 * num_salt)
+        ys, xs = np.unravel_index(flat, image.shape[:2])
+        noisy[ys[:num_salt], xs[:num_salt]] = 255
+        noisy[ys[num_salt:], xs[num_salt:]] = 0
 
-        # Pepper (pixels pretos)
-        num_pepper = int(amount * image.size)
-        coords_pepper = [np.random.randint(0, i, num_pepper) for i in image.shape[:2]]
-        if len(image.shape) == 3:
-            noisy[coords_pepper[0], coords_pepper[1], :] = 0
-        else:
-            noisy[coords_pepper[0], coords_pepper[1]] = 0
-
-    # Garante valores válidos
-    noisy = np.clip(noisy, 0, 255).astype(np.uint8)
+    # Garante valores válidos: o piso em 0 é feito in-place porque o
+    # convertScaleAbs tomaria o módulo dos negativos; o teto 255 e a conversão
+    # para uint8 saem numa única passada saturada do OpenCV
+    np.maximum(noisy, 0, out=noisy)
+    noisy = cv2.convertScaleAbs(noisy)
 
     return noisy
 
 
-def apply_elliptical_blur(image, area_percent=0.15, eccentricity=0.3, angle=None, add_noise_flag=True, noise_intensity=0.5):
+def apply_elliptical_blur(image, area_percent=0.15, eccentricity=0.3, angle=None, add_noise_flag=True, noise_intensity=0.5,
+                          image_f32=None, rng=None, level_workers=None):
     """
     Aplica motion blur elíptico com gradiente radial + ruído
 
@@ -227,6 +279,10 @@ def apply_elliptical_blur(image, area_percent=0.15, eccentricity=0.3, angle=None
         angle: Ângulo de rotação da elipse (None para aleatório)
         add_noise_flag: Se True, adiciona ruído à imagem
         noise_intensity: Intensidade do ruído (0.0 a 1.0)
+        image_f32: Imagem já convertida para float32 (reaproveitada entre amostras)
+        rng: Gerador aleatório (np.random.Generator); None usa o gerador do módulo
+        level_workers: Threads para os níveis de blur (None = um por núcleo, até
+            o número de níveis; 1 = sequencial, para quem já paraleliza fora)
 
     Returns:
         Imagem com blur aplicado, máscara, parâmetros
@@ -234,6 +290,9 @@ def apply_elliptical_blur(image, area_percent=0.15, eccentricity=0.3, angle=None
     h, w = image.shape[:2]
     image_area = h * w
 
+    if rng is None:
+        rng = _RNG
+
     # Centro da imagem
     img_center_x = w // 2
     img_center_y = h // 2
@@ -256,7 +315,7 @@ def apply_elliptical_blur(image, area_percent=0.15, eccentricity=0.3, angle=None
     margin = max(a, b)
 
     # Escolhe ângulo radial aleatório (direção do centro da imagem → centro da elipse)
-    radial_angle = np.random.uniform(0, 2 * np.pi)
+    radial_angle = rng.uniform(0, 2 * np.pi)
 
     # Calcula distância máxima possível nesta direção radial
     # A elipse precisa caber na imagem: centro ± margin dentro dos limites
@@ -285,7 +344,7 @@ def apply_elliptical_blur(image, area_percent=0.15, eccentricity=0.3, angle=None
         # Se não cabe, usa a distância máxima possível
         dist = max_dist_from_center
     else:
-        dist = np.random.uniform(min_dist_from_center, max_dist_from_center)
+        dist = rng.uniform(min_dist_from_center, max_dist_from_center)
 
     center_x = int(img_center_x + dist * cos_r)
     center_y = int(img_center_y + dist * sin_r)
@@ -301,7 +360,7 @@ def apply_elliptical_blur(image, area_percent=0.15, eccentricity=0.3, angle=None
     tangent_angle = radial_angle_deg + 90
     # Adiciona variação aleatória de ±25°
     if angle is None:
-        angle = tangent_angle + np.random.uniform(-25, 25)
+        angle = tangent_angle + rng.uniform(-25, 25)
 
     # Calcula ângulo do motion blur (do centro da imagem até centro da elipse)
     dx = center_x - img_center_x
@@ -311,48 +370,152 @@ def apply_elliptical_blur(image, area_percent=0.15, eccentricity=0.3, angle=None
     # Cria máscara com gradiente radial (do centro da imagem para fora)
     gradient_mask, mask_radial, mask_ellipse = create_gradient_mask(h, w, center_x, center_y, a, b, angle)
 
-    # Aplica motion blur com intensidade variável
-    result = image.copy().astype(np.float32)
-
-    # Adiciona ruído se solicitado
+    # Imagem de partida em uint8 (com ruído, se solicitado)
     if add_noise_flag:
-        result = add_noise(result, noise_type='mixed', intensity=noise_intensity)
-
-    # Define níveis de blur (do mais fraco ao mais forte)
-    blur_levels = [3, 6, 9, 12, 15, 18, 21, 24, 27, 30, 33, 36]  # Tamanhos de kernel
+        source = add_noise(image, noise_type='mixed', intensity=noise_intensity, rng=rng)
+    else:
+        source = image
 
-    # Aplica blur progressivo baseado na máscara gradiente
-    for i, kernel_size in enumerate(blur_levels):
-        # Normaliza gradiente para este nível
-        level_min = i / len(blur_levels)
-        level_max = (i + 1) / len(blur_levels)
+    # Níveis de referência do blur (do mais fraco ao mais forte); os
+    # intermediários são interpolados a partir do gradiente
+    blur_levels = (3, 12, 24, 36)  # Tamanhos de kernel
 
-        # Cria máscara para este nível
-        level_mask = np.clip((gradient_mask - level_min) / (level_max - level_min), 0, 1)
+    # Gradiente quantizado em uint8 (também é a máscara visual combinada)
+    mask_combined = (gradient_mask * 255).astype(np.uint8)
 
-        # Aplica motion blur
-        kernel = create_motion_blur_kernel(kernel_size, motion_angle)
-        blurred = cv2.filter2D(image.astype(np.float32), -1, kernel)
+    # O gradiente é zero fora da elipse: o blur só precisa ser calculado no
+    # retângulo envolvente da elipse rotacionada, com margem do raio do maior
+    # kernel (+1 pixel para a interpolação das rotações)
+    x0, x1, y0, y1 = ellipse_bounding_box(h, w, center_x, center_y, a, b, angle,
+                                          pad=max(blur_levels) // 2 + 1)
+
+    # Fora do retângulo a imagem não muda: só a região da elipse passa por
+    # float32, o restante é copiado direto em uint8
+    # Sem image_f32 pré-convertida (modo single-output), converte só a ROI
+    if image_f32 is not None:
+        roi = image_f32[y0:y1, x0:x1]
+    else:
+        roi = image[y0:y1, x0:x1].astype(np.float32)
+    roi_mask = mask_combined[y0:y1, x0:x1]
+
+    # Com OpenCL disponível, os filtros rodam via T-API (UMat) na GPU/iGPU;
+    # a ROI é enviada uma única vez e reaproveitada em todos os níveis
+    use_opencl = cv2.ocl.haveOpenCL() and cv2.ocl.useOpenCL()
+    roi_src = cv2.UMat(np.ascontiguousarray(roi)) if use_opencl else roi
+
+    # Motion blur linear é uma média ao longo da direção do movimento: a ROI é
+    # rotacionada uma única vez para alinhar essa direção ao eixo x e cada
+    # nível vira um boxFilter 1-D (k x 1), O(k) em vez de O(k²) por pixel.
+    # A tela rotacionada cobre a diagonal da ROI para não cortar os cantos
+    roi_h, roi_w = roi.shape[:2]
+    canvas = int(np.ceil(np.hypot(roi_h, roi_w)))
+    rotation = cv2.getRotationMatrix2D(((roi_w - 1) / 2, (roi_h - 1) / 2), -motion_angle, 1.0)
+    rotation[0, 2] += (canvas - roi_w) / 2
+    rotation[1, 2] += (canvas - roi_h) / 2
+    rotated = cv2.warpAffine(roi_src, rotation, (canvas, canvas),
+                             flags=cv2.INTER_LINEAR, borderMode=cv2.BORDER_REPLICATE)
+
+    # Pirâmide de blur: nível 0 é a imagem de partida, sem blur. Os níveis
+    # são escritos direto num único buffer pré-alocado (sem np.stack)
+    levels = np.empty((len(blur_levels) + 1,) + roi.shape, dtype=np.float32)
+    levels[0] = source[y0:y1, x0:x1]
+
+    def blur_level(i, kernel_size):
+        # Desfaz a rotação com a mesma matriz (mapa inverso)
+        blurred = cv2.boxFilter(rotated, -1, (kernel_size, 1))
+        if use_opencl:
+            levels[i] = cv2.warpAffine(blurred, rotation, (roi_w, roi_h),
+                                       flags=cv2.INTER_LINEAR | cv2.WARP_INVERSE_MAP,
+                                       borderMode=cv2.BORDER_REPLICATE).get()
+        else:
+            cv2.warpAffine(blurred, rotation, (roi_w, roi_h), dst=levels[i],
+                           flags=cv2.INTER_LINEAR | cv2.WARP_INVERSE_MAP,
+                           borderMode=cv2.BORDER_REPLICATE)
 
-        # Combina com resultado
-        level_mask_3ch = np.stack([level_mask] * 3, axis=-1)
-        result = result * (1 - level_mask_3ch) + blurred * level_mask_3ch
+    if level_workers is None:
+        level_workers = min(len(blur_levels), os.cpu_count() or 1)
 
-    result = result.astype(np.uint8)
+    if use_opencl or level_workers <= 1:
+        for i, kernel_size in enumerate(blur_levels, start=1):
+            blur_level(i, kernel_size)
+    else:
+        # Os níveis são independentes e o OpenCV libera o GIL: cada um roda
+        # numa thread. O paralelismo interno do OpenCV é desligado para não
+        # disputar os mesmos núcleos (e restaurado ao final)
+        prev_threads = cv2.getNumThreads()
+        cv2.setNumThreads(1)
+        try:
+            with ThreadPoolExecutor(max_workers=level_workers) as pool:
+                futures = [pool.submit(blur_level, i, kernel_size)
+                           for i, kernel_size in enumerate(blur_levels, start=1)]
+                for future in futures:
+                    future.result()
+        finally:
+            cv2.setNumThreads(prev_threads)
+
+    # Aplica motion blur com intensidade variável: o gradiente define um
+    # tamanho de kernel contínuo (0 a 36) e cada pixel interpola os dois
+    # níveis vizinhos da pirâmide (posição lida das tabelas de consulta)
+    lut_idx, lut_frac = _blur_level_lut(blur_levels)
+    frac = lut_frac[roi_mask][..., np.newaxis]
+    idx = lut_idx[roi_mask][np.newaxis, ..., np.newaxis]
+    lower = np.take_along_axis(levels, idx, axis=0)[0]
+    upper = np.take_along_axis(levels, idx + 1, axis=0)[0]
+    # lower + (upper - lower) * frac, in-place sobre os buffers do take_along_axis
+    np.subtract(upper, lower, out=upper)
+    upper *= frac
+    lower += upper
+    roi_result = lower
+
+    result = source.copy()
+    # A interpolação entre níveis nunca fica negativa: conversão saturada direta
+    result[y0:y1, x0:x1] = cv2.convertScaleAbs(roi_result)
 
     # Cria máscaras visuais (para debug)
-    mask_combined = (gradient_mask * 255).astype(np.uint8)
     mask_radial_visual = (mask_radial * 255).astype(np.uint8)
     # Inverte a máscara da elipse para mostrar como é usada na combinação
     # (1 - mask_ellipse): 1 no centro → 0 nas bordas = branco no centro, preto nas bordas
     mask_ellipse_inverted = np.zeros_like(mask_ellipse)
-    ellipse_region = mask_ellipse > 0
+    # Região da elipse: o gradiente é >= 0.05 dentro dela e zero fora (a
+    # máscara da elipse é 0 também no centro, que ficaria de fora)
+    ellipse_region = gradient_mask > 0
     mask_ellipse_inverted[ellipse_region] = 1.0 - mask_ellipse[ellipse_region]
     mask_ellipse_visual = (mask_ellipse_inverted * 255).astype(np.uint8)
 
     return result, mask_combined, mask_radial_visual, mask_ellipse_visual, (center_x, center_y, a, b, angle, motion_angle)
 
 
+# Imagem de entrada de cada processo do modo batch (enviada uma única vez
+# por processo pelo initializer, em vez de a cada amostra)
+_WORKER_IMAGE = None
+_WORKER_IMAGE_F32 = None
+
+
+def _init_worker(image):
+    """Inicializa um processo do modo batch com a imagem de entrada"""
+    global _WORKER_IMAGE, _WORKER_IMAGE_F32
+    _WORKER_IMAGE = image
+    # Conversão para float32 feita uma única vez por processo
+    _WORKER_IMAGE_F32 = image.astype(np.float32)
+    # O paralelismo vem do pool de processos: o OpenCV fica com uma thread
+    # por processo para não disputar os núcleos
+    cv2.setNumThreads(1)
+
+
+def _process_sample(area_percent, eccentricity, seed, add_noise_flag=True, noise_intensity=0.5):
+    """Gera uma amostra do modo batch num processo do pool (níveis sequenciais)"""
+    return apply_elliptical_blur(
+        _WORKER_IMAGE,
+        area_percent,
+        eccentricity,
+        add_noise_flag=add_noise_flag,
+        noise_intensity=noise_intensity,
+        image_f32=_WORKER_IMAGE_F32,
+        rng=np.random.default_rng(seed),
+        level_workers=1
+    )
+
+
 def main():
     parser = argparse.ArgumentParser(description='Testa degradação de imagem com blur elíptico')
     parser.add_argument('input', type=str, help='Caminho da imagem de entrada')
@@ -374,9 +537,14 @@ def main():
                         help='Intensidade do ruído 0.0 a 1.0 (padrão: 0.5)')
     parser.add_argument('--single-output', type=str, default=None,
                         help='Modo produção: processa 1 imagem e salva no caminho especificado')
+    parser.add_argument('--seed', type=int, default=None,
+                        help='Semente do gerador aleatório, para resultados reproduzíveis (padrão: aleatória)')
 
     args = parser.parse_args()
 
+    # Gerador único para todos os sorteios
+    rng = np.random.default_rng(args.seed)
+
     # Carrega imagem
     input_path = Path(args.input)
     if not input_path.exists():
@@ -392,15 +560,16 @@ def main():
     if args.single_output:
         import json
 
-        area_percent = np.random.uniform(args.area_min, args.area_max)
-        eccentricity = np.random.uniform(args.ecc_min, args.ecc_max)
+        area_percent = rng.uniform(args.area_min, args.area_max)
+        eccentricity = rng.uniform(args.ecc_min, args.ecc_max)
 
         degraded, _, _, _, params = apply_elliptical_blur(
             image,
             area_percent,
             eccentricity,
             add_noise_flag=args.noise,
-            noise_intensity=args.noise_intensity
+            noise_intensity=args.noise_intensity,
+            rng=rng
         )
         center_x, center_y, a, b, angle, motion_angle = params
 
@@ -446,44 +615,82 @@ def main():
     print(f"\nGerando {args.samples} amostras degradadas...")
     print("-" * 70)
 
-    for i in range(args.samples):
-        # Parâmetros aleatórios
-        area_percent = np.random.uniform(args.area_min, args.area_max)
-        eccentricity = np.random.uniform(args.ecc_min, args.ecc_max)
-
-        # Aplica degradação
-        degraded, mask_combined, mask_radial, mask_ellipse, params = apply_elliptical_blur(
-            image,
-            area_percent,
-            eccentricity,
-            add_noise_flag=args.noise,
-            noise_intensity=args.noise_intensity
-        )
-        center_x, center_y, a, b, angle, motion_angle = params
-
-        # Salva imagem degradada
-        output_path = output_dir / f"{i+1:02d}_degraded.png"
-        cv2.imwrite(str(output_path), degraded)
-
-        # Salva máscaras separadas
-        mask_combined_path = output_dir / f"{i+1:02d}_mask_combined.png"
-        cv2.imwrite(str(mask_combined_path), mask_combined)
-
-        mask_radial_path = output_dir / f"{i+1:02d}_mask_radial.png"
-        cv2.imwrite(str(mask_radial_path), mask_radial)
-
-        mask_ellipse_path = output_dir / f"{i+1:02d}_mask_ellipse.png"
-        cv2.imwrite(str(mask_ellipse_path), mask_ellipse)
-
-        print(f"Amostra {i+1}:")
-        print(f"  - Arquivo: {output_path.name}")
-        print(f"  - Área: {area_percent*100:.1f}% da imagem")
-        print(f"  - Excentricidade: {eccentricity:.2f}")
-        print(f"  - Centro elipse: ({center_x}, {center_y})")
-        print(f"  - Raios elipse: a={a}px, b={b}px")
-        print(f"  - Ângulo elipse: {angle:.1f}°")
-        print(f"  - Ângulo motion blur: {motion_angle:.1f}°")
-        print()
+    # Parâmetros aleatórios de todas as amostras, sorteados de uma vez
+    areas = rng.uniform(args.area_min, args.area_max, size=args.samples)
+    eccentricities = rng.uniform(args.ecc_min, args.ecc_max, size=args.samples)
+
+    # Cada amostra tem seu próprio fluxo aleatório, derivado da semente, para
+    # que o resultado não dependa da ordem de execução dos processos
+    sample_seeds = np.random.SeedSequence(args.seed).spawn(args.samples)
+
+    # As amostras são independentes e rodam num pool de processos; a
+    # codificação PNG e a escrita em disco ficam no processo principal, em
+    # threads (o OpenCV libera o GIL). Com um único processo o pool só
+    # acrescentaria custo (criação e serialização), e as amostras rodam aqui,
+    # com o paralelismo interno do OpenCV e dos níveis de blur
+    sample_workers = min(os.cpu_count() or 1, args.samples)
+    if sample_workers > 1:
+        pool = ProcessPoolExecutor(max_workers=sample_workers, initializer=_init_worker, initargs=(image,))
+        process_sample = partial(_process_sample, add_noise_flag=args.noise,
+                                 noise_intensity=args.noise_intensity)
+        sample_map = pool.map
+    else:
+        pool = nullcontext()
+        # Conversão para float32 feita uma única vez para todas as amostras
+        image_f32 = image.astype(np.float32)
+
+        def process_sample(area_percent, eccentricity, seed):
+            return apply_elliptical_blur(
+                image,
+                area_percent,
+                eccentricity,
+                add_noise_flag=args.noise,
+                noise_intensity=args.noise_intensity,
+                image_f32=image_f32,
+                rng=np.random.default_rng(seed)
+            )
+
+        sample_map = map
+
+    with pool, ThreadPoolExecutor(max_workers=os.cpu_count()) as writer:
+        writes = []
+        mask_png_params = [cv2.IMWRITE_PNG_COMPRESSION, 1]
+        samples = sample_map(process_sample, areas, eccentricities, sample_seeds)
+
+        for i, sample in enumerate(samples):
+            area_percent = areas[i]
+            eccentricity = eccentricities[i]
+
+            degraded, mask_combined, mask_radial, mask_ellipse, params = sample
+            center_x, center_y, a, b, angle, motion_angle = params
+
+            # Salva imagem degradada (gravações em paralelo com a próxima amostra)
+            output_path = output_dir / f"{i+1:02d}_degraded.png"
+            writes.append(writer.submit(cv2.imwrite, str(output_path), degraded))
+
+            # Salva máscaras separadas (compressão PNG mínima: são só para debug)
+            mask_combined_path = output_dir / f"{i+1:02d}_mask_combined.png"
+            writes.append(writer.submit(cv2.imwrite, str(mask_combined_path), mask_combined, mask_png_params))
+
+            mask_radial_path = output_dir / f"{i+1:02d}_mask_radial.png"
+            writes.append(writer.submit(cv2.imwrite, str(mask_radial_path), mask_radial, mask_png_params))
+
+            mask_ellipse_path = output_dir / f"{i+1:02d}_mask_ellipse.png"
+            writes.append(writer.submit(cv2.imwrite, str(mask_ellipse_path), mask_ellipse, mask_png_params))
+
+            print(f"Amostra {i+1}:")
+            print(f"  - Arquivo: {output_path.name}")
+            print(f"  - Área: {area_percent*100:.1f}% da imagem")
+            print(f"  - Excentricidade: {eccentricity:.2f}")
+            print(f"  - Centro elipse: ({center_x}, {center_y})")
+            print(f"  - Raios elipse: a={a}px, b={b}px")
+            print(f"  - Ângulo elipse: {angle:.1f}°")
+            print(f"  - Ângulo motion blur: {motion_angle:.1f}°")
+            print()
+
+        # Propaga eventuais erros de escrita
+        for future in writes:
+            future.result()
 
     print("-" * 70)
     print(f"\n✓ {args.samples} amostras geradas em: {output_dir}")